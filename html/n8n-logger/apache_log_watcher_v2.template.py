@@ -1,11 +1,190 @@
+import asyncio
+import collections
+import functools
+import hashlib
 import json
+import sqlite3
 import subprocess
 import os
 import time
-import requests
+import httpx
 import re
 import datetime
 from cachetools import TTLCache
+from concurrent.futures import ProcessPoolExecutor
+from inotify_simple import INotify, flags
+
+# Hot-path regexes compiled once at import; the blame/diff parsers run them
+# per output line, so per-call compile-cache lookups add up. The subprocess
+# parsers work on raw bytes to skip decoding large blame/diff streams.
+_IN_ON_LINE = re.compile(r'in ([^\s]+?)(?:\((\d+)\) : eval\(\)\'d code)? on line (\d+)')
+# PHP stack-trace frames: '#0 /path/file.php(123): func()'. These carry the
+# bulk of a fatal's (file, line) pairs; the header/trailer only repeat one.
+_STACK_FRAME = re.compile(r'^#\d+ (/\S+?)\((\d+)\):', re.MULTILINE)
+_PORCELAIN_HEADER = re.compile(rb'^([0-9a-f]{40}) \d+ (\d+)')
+_HUNK = re.compile(rb'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+_HUNK_SPLIT = re.compile(rb'(?m)^(?=@@)')
+# Bracketed Apache prefixes (timestamp, level, pid, client) vary per hit but
+# not per error; stripped before fingerprinting so repeats hash identically.
+_TRACE_NOISE = re.compile(r'\[[^\]]*\]\s*')
+# DocumentRoot / <Directory> paths, and any other absolute path a vhost
+# mentions (Alias targets etc.) — both feed the inverted vhost index. The
+# lookbehind keeps closing tags like </Directory> from indexing junk keys.
+_VHOST_DIRECTIVE_PATH = re.compile(r'(?:DocumentRoot\s+|<Directory\s+)"?(/[^\s">]+)')
+_VHOST_ANY_PATH = re.compile(r'(?<![<\w])/[\w.-]+(?:/[\w.-]+)*')
+
+# Porcelain metadata prefixes we care about -> (prefix length, blame field).
+# Used as a dispatch table so the parse loop does one prefix probe per line
+# instead of a chain of startswith/regex checks.
+_PORCELAIN_FIELDS = {
+    b'author ': (7, 'author'),
+    b'author-mail ': (12, 'email'),
+    b'summary ': (8, 'summary'),
+}
+
+def _parse_porcelain(blame_output):
+    """
+    Parses `git blame --porcelain` output covering one or more -L ranges.
+
+    Commit metadata only appears the first time a commit shows up in the
+    stream, so author/email/summary are accumulated per commit and shared
+    across every line attributed to it. Module-level (and pure) so it can be
+    shipped to a process pool worker for large streams.
+
+    Args:
+        blame_output (bytes): Raw porcelain stream.
+
+    Returns:
+        dict: Mapping of final line number -> blame dict.
+    """
+    commit_meta = {}
+    line_shas = {}
+    current_sha = None
+
+    for line in blame_output.split(b'\n'):
+        if not line or line[:1] == b'\t':  # content lines are the common case
+            continue
+        header = _PORCELAIN_HEADER.match(line)
+        if header:
+            current_sha = header.group(1)
+            line_shas[int(header.group(2))] = current_sha
+            commit_meta.setdefault(current_sha, {})
+            continue
+        if current_sha is None:
+            continue
+        for prefix, (offset, field) in _PORCELAIN_FIELDS.items():
+            if line.startswith(prefix):
+                value = line[offset:].decode()
+                commit_meta[current_sha][field] = value.strip('<>') if field == 'email' else value
+                break
+
+    blames = {}
+    for line_number, sha in line_shas.items():
+        meta = commit_meta.get(sha, {})
+        blames[line_number] = {
+            "author": meta.get('author'),
+            "email": meta.get('email'),
+            "commit": sha[:8].decode(),
+            "summary": meta.get('summary'),
+            "is_local_changes": set(sha) == {ord('0')}
+        }
+    return blames
+
+def _find_diff_line(diff_output, line_number):
+    """
+    Finds the added diff line for line_number in a zero-context diff.
+
+    Splits the diff on hunk headers and jumps straight to the hunk whose
+    new-file range covers the target, walking only that hunk's '+' lines —
+    O(hunks) instead of a scan over every diff line. Module-level (and
+    pure) so it can be shipped to a process pool worker for large diffs.
+
+    Args:
+        diff_output (bytes): Raw `git diff -U0` output.
+        line_number (int): New-file line number to locate.
+
+    Returns:
+        bytes | None: The added diff line, or None if the line is untouched.
+    """
+    for hunk in _HUNK_SPLIT.split(diff_output)[1:]:
+        match = _HUNK.match(hunk)
+        if not match:
+            continue
+        start = int(match.group(1))
+        count = int(match.group(2)) if match.group(2) else 1
+        if not (start <= line_number < start + count):
+            continue
+        current = start
+        for line in hunk.split(b'\n')[1:]:
+            if line[:1] == b'-':
+                continue
+            if line[:1] == b'\\':
+                # '\ No newline at end of file' marker, not a hunk boundary.
+                continue
+            if line[:1] != b'+':
+                break  # past the hunk body
+            if current == line_number:
+                return line
+            current += 1
+        break
+    return None
+
+@functools.lru_cache(maxsize=4096)
+def _ancestor_dirs(file_path):
+    """
+    Returns every ancestor directory of file_path, nearest first.
+
+    Cached because the same file paths recur across many trace lines, so the
+    repeated os.path.dirname walks collapse into a single tuple lookup.
+
+    Args:
+        file_path (str): Absolute file path.
+
+    Returns:
+        tuple: Ancestor directories, e.g. ('/var/www/site1/app', '/var/www/site1', '/var/www', '/var').
+    """
+    dirs = []
+    path = os.path.dirname(file_path)
+    while path not in ('/', ''):
+        dirs.append(path)
+        path = os.path.dirname(path)
+    return tuple(dirs)
+
+class _ByteBoundedCache(collections.OrderedDict):
+    """
+    LRU mapping bounded by approximate serialized size instead of entry count.
+
+    Blame entries vary wildly in size (uncommitted-diff summaries can embed
+    whole diff lines), so an entry-count bound does not bound RSS. Each value
+    is costed at len(json.dumps(value)) and the oldest entries are evicted
+    until the total fits the byte budget.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._sizes = {}
+        self._total_bytes = 0
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        size = len(json.dumps(value, default=str))
+        if key in self:
+            self._total_bytes -= self._sizes[key]
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        self._sizes[key] = size
+        self._total_bytes += size
+        while self._total_bytes > self.max_bytes and len(self) > 1:
+            del self[next(iter(self))]
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._total_bytes -= self._sizes.pop(key)
 
 class LogWatcher:
     """
@@ -18,19 +197,36 @@ class LogWatcher:
     - Groups multi-line PHP stack traces.
     - Identifies file, line, vhost, Git remote, and blame information.
     - Forwards payload to n8n endpoint as JSON.
+    - Runs on asyncio: the tailer feeds a bounded queue drained by concurrent
+      sender workers, so slow webhook round-trips never stall log ingestion.
     - Uses persistent HTTP session and intelligent in-memory caching to remain efficient in high-traffic environments.
 
     Caches:
-    - vhost_cache (dict): Forever cached since vhost config rarely changes.
-    - git_root_cache (TTLCache): Cached per directory, TTL 1 hour.
-    - git_remote_cache (TTLCache): Cached per directory, TTL 1 hour.
-    - git_blame_cache (TTLCache): Cached per file and line, TTL 1 hour.
+    - vhost_cache (dict): Per-file results, reset when the vhost index reloads.
+    - git_root_cache (_ByteBoundedCache): Keyed by (dir, repo .git/HEAD mtime)
+      so entries self-invalidate when the repo changes; evicts LRU past 1MB.
+    - git_remote_cache (_ByteBoundedCache): Keyed by (dir, repo .git/config
+      mtime).
+    - git_blame_cache (_ByteBoundedCache): Keyed by (file, line, file mtime)
+      so an uncommitted edit forces a re-blame; evicts LRU past 8MB.
 
     Usage:
         watcher = LogWatcher(config_path='config.json', reload_interval=10)
-        watcher.run()
+        asyncio.run(watcher.run())
     """
 
+    # Number of concurrent sender coroutines draining the trace queue.
+    SEND_WORKERS = 8
+    # Window (seconds) during which an identical trace is only sent once.
+    DEDUP_WINDOW = 60
+    # How often suppressed-duplicate counts are flushed to n8n.
+    DEDUP_FLUSH_INTERVAL = 30
+    # Enriched payloads per webhook POST, and how long to wait filling a batch.
+    BATCH_MAX_SIZE = 64
+    BATCH_WINDOW = 0.25
+    # Parse outputs bigger than this move off the event loop to the pool.
+    PARSE_OFFLOAD_BYTES = 64 * 1024
+
     def __init__(self, config_path='config.json', reload_interval=10):
         """
         Initializes LogWatcher with config and caches.
@@ -47,18 +243,40 @@ class LogWatcher:
         self.config = {}
         self.last_config_load_time = 0
         self.load_config()
-        # Updated regex to catch all PHP error types and MySQL errors
+        # Updated regex to catch all PHP error types and MySQL errors.
+        # Bytes pattern: the tailer matches raw log bytes without decoding.
         self.error_start_pattern = re.compile(
-            r'(PHP (Fatal error|Warning|Notice|Parse error|Deprecated)|MySQL Error|\[error\])',
+            rb'(PHP (Fatal error|Warning|Notice|Parse error|Deprecated)|MySQL Error|\[error\])',
             re.IGNORECASE
         )
 
-        self.vhost_cache = {}  # Forever cache
-        self.git_root_cache = TTLCache(maxsize=1000, ttl=86400)
-        self.git_remote_cache = TTLCache(maxsize=1000, ttl=86400)
-        self.git_blame_cache = TTLCache(maxsize=5000, ttl=86400)
+        self.vhost_cache = {}  # Per-file results, reset when the vhost index reloads
+        self._vhost_index = None  # docroot path -> vhost file, built lazily
+        self._vhost_index_mtime = 0
+        # Keyed by (path, mtime signature) instead of a coarse TTL: entries
+        # self-invalidate the moment the underlying file changes, so hits are
+        # always fresh and unchanged entries never expire. Byte-bounded so
+        # keys with superseded signatures age out instead of leaking.
+        self.git_root_cache = _ByteBoundedCache(max_bytes=1024 * 1024)
+        self.git_remote_cache = _ByteBoundedCache(max_bytes=1024 * 1024)
+        # Blame values can be large; bound the cache by bytes, not entries.
+        self.git_blame_cache = _ByteBoundedCache(max_bytes=8 * 1024 * 1024)
+
+        # Fingerprints of recently forwarded traces; repeats within the
+        # window only bump a counter instead of re-running git + POST.
+        self._seen_traces = TTLCache(maxsize=10_000, ttl=self.DEDUP_WINDOW)
+        self._duplicate_counts = {}
 
-        self.session = requests.Session()
+        self.session = None  # httpx.AsyncClient, created inside the running loop
+        self._outbox = None  # enriched payloads awaiting batched delivery
+
+        # On-disk layer under the root/remote/vhost caches so a restart does
+        # not replay the whole recompute storm against a warm log backlog.
+        self._db = self._open_cache_db()
+
+        # Pool for CPU-bound parsing of large blame/diff streams so bursts
+        # of enrichment work cannot starve the tailer on the loop thread.
+        self._pool = ProcessPoolExecutor(max_workers=os.cpu_count())
 
     def load_config(self):
         """
@@ -85,31 +303,170 @@ class LogWatcher:
         """
         return (time.time() - self.last_config_load_time) >= self.reload_interval
 
-    def send_to_n8n(self, error_trace):
+    def _open_cache_db(self):
+        """
+        Opens (or creates) the persistent cache database.
+
+        The path defaults to /var/cache/n8n-logger/cache.sqlite and can be
+        overridden via the 'cache_db' config key. Failures only disable
+        persistence; the in-memory caches keep working.
+
+        Returns:
+            sqlite3.Connection | None: Open connection, or None when disabled.
+        """
+        db_path = self.config.get('cache_db', '/var/cache/n8n-logger/cache.sqlite')
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            db = sqlite3.connect(db_path, isolation_level=None)
+            db.execute('CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, mtime INTEGER, v TEXT)')
+            return db
+        except (OSError, sqlite3.Error) as e:
+            print(f"[CACHE] Persistent cache disabled: {e}")
+            return None
+
+    def _db_get(self, key, mtime):
         """
-        Sends the error trace to the n8n webhook defined in config.
+        Looks up a persisted cache entry with a matching mtime signature.
 
         Args:
-            error_trace (str): The full error message trace (possibly multi-line)
+            key (str): Namespaced cache key, e.g. 'root:/var/www/site1'.
+            mtime (int): mtime signature the entry must match.
 
-        Exceptions:
-            Handles connection and timeout errors to n8n.
+        Returns:
+            tuple | None: 1-tuple holding the value on hit (the value itself
+            may be None), or None on miss.
+        """
+        if not self._db:
+            return None
+        try:
+            row = self._db.execute(
+                'SELECT v FROM kv WHERE k = ? AND mtime = ?', (key, mtime)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return None if row is None else (json.loads(row[0]),)
+
+    def _db_put(self, key, mtime, value):
         """
-        n8n_url = self.config.get("n8n_url")
-        if not n8n_url:
-            print("[WARN] n8n URL not set in config.")
+        Persists a cache entry, replacing any stale-signature predecessor.
+
+        Args:
+            key (str): Namespaced cache key.
+            mtime (int): mtime signature of the entry.
+            value: JSON-serializable cached value.
+        """
+        if not self._db:
             return
+        try:
+            self._db.execute(
+                'INSERT OR REPLACE INTO kv (k, mtime, v) VALUES (?, ?, ?)',
+                (key, mtime, json.dumps(value))
+            )
+        except sqlite3.Error:
+            pass
 
+    @staticmethod
+    def _mtime_ns(path):
+        """
+        Returns the mtime (ns) of path as a cache signature, or 0 if unreadable.
+
+        Args:
+            path (str): File to stat.
+
+        Returns:
+            int: st_mtime_ns, or 0 when the file is missing/inaccessible.
+        """
         try:
-            error_detail = self.get_project_info(error_trace)
-            print(f"[SEND] Sending error trace to n8n:")
-            self.session.post(n8n_url, json={"error": error_trace, "error_detail": error_detail}, timeout=2)
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _git_dir_for(file_path):
+        """
+        Locates the .git directory governing file_path.
+
+        Erroring files sit deep inside a repo, so the HEAD/config whose
+        mtimes drive cache invalidation live at the repo root, not next to
+        the file. Walks the (cached) ancestor chain to the first directory
+        containing a .git entry.
+
+        Args:
+            file_path (str): Absolute file path.
+
+        Returns:
+            str | None: Path to the .git directory, or None outside any repo.
+        """
+        for ancestor in _ancestor_dirs(file_path):
+            git_dir = os.path.join(ancestor, '.git')
+            if os.path.exists(git_dir):
+                return git_dir
+        return None
+
+    async def send_to_n8n(self, error_trace):
+        """
+        Enriches the error trace and queues it for batched delivery to n8n.
+
+        The actual HTTP POST happens in _post_batches, which coalesces
+        payloads so a burst of errors costs one round-trip, not one each.
+
+        Args:
+            error_trace (str): The full error message trace (possibly multi-line)
+
+        Exceptions:
+            Handles enrichment errors; delivery errors are handled by the batcher.
+        """
+        try:
+            await self._prewarm_blame_cache(error_trace)
+            error_detail = await self.get_project_info(error_trace)
+            await self._outbox.put({"error": error_trace, "error_detail": error_detail})
         except Exception as e:
-            print(f"[ERROR] Failed to send to n8n: \n{e}")
+            print(f"[ERROR] Failed to enrich trace for n8n: \n{e}")
+
+    async def _post_batches(self):
+        """
+        Drains enriched payloads from the outbox and POSTs them in batches.
+
+        Waits up to BATCH_WINDOW seconds to fill a batch of BATCH_MAX_SIZE
+        payloads, then sends them as one {"batch": [...]} request so bursts
+        amortize the per-request HTTP overhead.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._outbox.get()]
+            deadline = loop.time() + self.BATCH_WINDOW
+            while len(batch) < self.BATCH_MAX_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._outbox.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            n8n_url = self.config.get("n8n_url")
+            if not n8n_url:
+                print("[WARN] n8n URL not set in config.")
+                continue
+
+            try:
+                print(f"[SEND] Sending batch of {len(batch)} error trace(s) to n8n:")
+                await self.session.post(n8n_url, json={"batch": batch})
+            except Exception as e:
+                print(f"[ERROR] Failed to send to n8n: \n{e}")
 
-    def tail_log(self):
+    # Seconds without a new line before a pending trace is flushed.
+    TRACE_IDLE_TIMEOUT = 2
+    # Bytes pulled per read() while draining appended log data.
+    READ_CHUNK = 64 * 1024
+
+    async def tail_log(self):
         """
-        Generator that tails the Apache error log and yields grouped PHP error traces.
+        Async generator that tails the Apache error log and yields grouped PHP error traces.
+
+        Uses inotify so the coroutine sleeps until the kernel reports the log
+        actually grew, instead of polling readline() twice a second. Log
+        rotation (move/delete of the watched file) is handled by reopening.
 
         Yields:
             str: Multi-line error trace strings.
@@ -122,57 +479,280 @@ class LogWatcher:
             print(f"[ERROR] Invalid or missing log file: {log_file}")
             return
 
-        with open(log_file, 'r') as f:
-            f.seek(0, os.SEEK_END)
-            current_trace = []
-            while True:
-                line = f.readline()
-                if not line:
-                    time.sleep(0.5)
-                    continue
+        watch_flags = flags.MODIFY | flags.MOVE_SELF | flags.DELETE_SELF
+        inotify = INotify()
+        wd = inotify.add_watch(log_file, watch_flags)
+        fd = os.open(log_file, os.O_RDONLY | os.O_NONBLOCK)
+        os.lseek(fd, 0, os.SEEK_END)
+        current_trace = []  # grouped lines, kept as bytes until yielded
+        buf = bytearray()  # appended bytes not yet terminated by a newline
+        last_line_time = time.monotonic()
 
-                line = line.strip()
-                if self.error_start_pattern.search(line):
-                    if current_trace:
-                        yield "\n".join(current_trace)
-                        current_trace = []
-
-                current_trace.append(line)
+        try:
+            while True:
+                # Block (off-loop) until the log changes; the 500ms timeout
+                # only exists so pending traces and config reloads still tick.
+                events = await asyncio.to_thread(inotify.read, 500)
+                rotated = any(
+                    event.mask & (flags.MOVE_SELF | flags.DELETE_SELF)
+                    for event in events
+                )
 
-                fcntl_wait_time = 2
-                fcntl_start_time = time.time()
+                # Raw 64KB reads on the fd skip the TextIOWrapper and the
+                # per-line str allocations; lines stay bytes until a whole
+                # trace is yielded, so decoding happens once per trace.
+                got_data = False
                 while True:
-                    next_line = f.readline()
-                    if not next_line:
-                        if time.time() - fcntl_start_time >= fcntl_wait_time:
-                            yield "\n".join(current_trace)
+                    chunk = os.read(fd, self.READ_CHUNK)
+                    if not chunk:
+                        break
+                    got_data = True
+                    buf += chunk
+
+                if got_data:
+                    while (nl := buf.find(b'\n')) != -1:
+                        line = bytes(buf[:nl])
+                        del buf[:nl + 1]
+                        # Stack frames ('#0 ...'), indented context and trailer
+                        # lines can never start a new error; skip the header
+                        # regex entirely for them (they outnumber headers
+                        # 5-10x in a typical trace).
+                        if not line or line[:1] in b' \t#' or line.startswith((b'Stack trace', b'thrown in')):
+                            current_trace.append(line.strip())
+                            continue
+                        line = line.strip()
+                        if self.error_start_pattern.search(line) and current_trace:
+                            yield b"\n".join(current_trace).decode('utf-8', 'replace')
                             current_trace = []
-                            break
-                        time.sleep(0.2)
-                        continue
-                    next_line = next_line.strip()
-                    current_trace.append(next_line)
-                    fcntl_start_time = time.time()
+                        current_trace.append(line)
+                    last_line_time = time.monotonic()
+
+                if current_trace and time.monotonic() - last_line_time >= self.TRACE_IDLE_TIMEOUT:
+                    yield b"\n".join(current_trace).decode('utf-8', 'replace')
+                    current_trace = []
+
+                if rotated:
+                    print(f"[INFO] Log file rotated, reopening: {log_file}")
+                    os.close(fd)
+                    try:
+                        inotify.rm_watch(wd)
+                    except OSError:
+                        pass  # watch already gone after DELETE_SELF
+                    while not os.path.isfile(log_file):
+                        await asyncio.sleep(0.5)
+                    fd = os.open(log_file, os.O_RDONLY | os.O_NONBLOCK)
+                    buf.clear()
+                    wd = inotify.add_watch(log_file, watch_flags)
+        finally:
+            os.close(fd)
+            inotify.close()
+
+    @staticmethod
+    def _trace_fingerprint(error_trace):
+        """
+        Hashes a trace with its per-hit noise (timestamps, pids) stripped.
 
-    def run(self):
+        Args:
+            error_trace (str): Full error trace.
+
+        Returns:
+            bytes: 16-byte BLAKE2b digest identifying the underlying error.
+        """
+        normalized = _TRACE_NOISE.sub('', error_trace)
+        return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+    async def _flush_duplicate_counts(self):
+        """
+        Periodically forwards counts of suppressed duplicate traces to n8n.
+
+        Runs as a background task so that during an error storm n8n still
+        sees how often each deduplicated error fired, without one POST per
+        occurrence.
+        """
+        while True:
+            await asyncio.sleep(self.DEDUP_FLUSH_INTERVAL)
+            if not self._duplicate_counts:
+                continue
+            counts, self._duplicate_counts = self._duplicate_counts, {}
+            n8n_url = self.config.get("n8n_url")
+            if not n8n_url:
+                continue
+            payload = {
+                "duplicates": [
+                    {"error": first_line, "count": count}
+                    for count, first_line in counts.values()
+                ]
+            }
+            try:
+                await self.session.post(n8n_url, json=payload)
+            except Exception as e:
+                print(f"[ERROR] Failed to send duplicate counts to n8n: \n{e}")
+
+    async def _send_worker(self, queue):
+        """
+        Worker coroutine: pulls traces off the queue and forwards them to n8n.
+
+        Args:
+            queue (asyncio.Queue): Queue of error trace strings.
+        """
+        while True:
+            error_trace = await queue.get()
+            try:
+                await self.send_to_n8n(error_trace)
+            finally:
+                queue.task_done()
+
+    async def run(self):
         """
         Starts the log watcher loop, monitoring Apache error logs and sending PHP errors to n8n.
+
+        The tailer only enqueues traces; SEND_WORKERS concurrent workers do the
+        enrichment and POSTs, so webhook latency never blocks ingestion. If the
+        queue fills up (n8n outage), new traces are dropped rather than applying
+        backpressure to log reading.
         """
         print("[INFO] LogWatcher started with error trace grouping.")
-        for error_trace in self.tail_log():
-            if self.config_needs_reload():
-                self.load_config()
+        # HTTP/2 lets hundreds of concurrent POSTs multiplex over one
+        # keep-alive TLS connection instead of paying per-request handshakes.
+        self.session = httpx.AsyncClient(
+            http2=True,
+            timeout=2.0,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+        self._outbox = asyncio.Queue(maxsize=1000)
+        queue = asyncio.Queue(maxsize=1000)
+        workers = [
+            asyncio.create_task(self._send_worker(queue))
+            for _ in range(self.SEND_WORKERS)
+        ]
+        workers.append(asyncio.create_task(self._post_batches()))
+        workers.append(asyncio.create_task(self._flush_duplicate_counts()))
 
-            if not self.config.get("enabled", False):
-                print("[INFO] Sending disabled via config.")
-                continue
+        try:
+            async for error_trace in self.tail_log():
+                if self.config_needs_reload():
+                    self.load_config()
+
+                if not self.config.get("enabled", False):
+                    print("[INFO] Sending disabled via config.")
+                    continue
+
+                # During a storm the same fatal fires thousands of times a
+                # minute; repeats inside the window only bump a counter.
+                fingerprint = self._trace_fingerprint(error_trace)
+                if fingerprint in self._seen_traces:
+                    entry = self._duplicate_counts.setdefault(
+                        fingerprint, [0, error_trace.split("\n", 1)[0]]
+                    )
+                    entry[0] += 1
+                    continue
+                self._seen_traces[fingerprint] = True
+
+                try:
+                    queue.put_nowait(error_trace)
+                except asyncio.QueueFull:
+                    print("[WARN] Send queue full, dropping trace.")
+        finally:
+            for worker in workers:
+                worker.cancel()
+            # Let in-flight sends finish unwinding before the client goes
+            # away, and swallow the CancelledErrors so shutdown stays quiet.
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.session.aclose()
+            self._pool.shutdown(wait=False)
+
+    @staticmethod
+    def _vhost_dir_signature(vhost_dir):
+        """
+        Aggregate mtime signature for a vhost directory and its files.
+
+        The directory mtime alone misses in-place edits (and edits behind
+        sites-enabled symlinks, which os.stat follows), so the signature is
+        the max st_mtime_ns over the directory and every entry in it.
+
+        Args:
+            vhost_dir (str): Apache vhost directory.
+
+        Returns:
+            int: Aggregate mtime signature, or 0 when unreadable.
+        """
+        try:
+            signature = os.stat(vhost_dir).st_mtime_ns
+            for name in os.listdir(vhost_dir):
+                try:
+                    entry_mtime = os.stat(os.path.join(vhost_dir, name)).st_mtime_ns
+                except OSError:
+                    continue
+                signature = max(signature, entry_mtime)
+            return signature
+        except OSError:
+            return 0
+
+    def _build_vhost_index(self, vhost_dir):
+        """
+        Loads every vhost file in vhost_dir into an in-memory path index.
+
+        DocumentRoot and <Directory> paths are indexed first and win ties;
+        every other absolute path the config mentions (Alias targets, script
+        dirs, log dirs) is added behind them. Each path is indexed together
+        with all its ancestor prefixes, mirroring what the old `grep -l`
+        substring walk would have matched — but as dict probes instead of a
+        fork+exec per candidate directory.
+
+        Args:
+            vhost_dir (str): Apache vhost directory to index.
+
+        Returns:
+            dict: Mapping of mentioned path / path prefix -> vhost file path.
+        """
+        index = {}
+        try:
+            for name in sorted(os.listdir(vhost_dir)):
+                vhost_file = os.path.join(vhost_dir, name)
+                if not os.path.isfile(vhost_file):
+                    continue
+                try:
+                    with open(vhost_file) as f:
+                        body = f.read()
+                except OSError:
+                    continue
+                for path in _VHOST_DIRECTIVE_PATH.findall(body):
+                    self._index_path_prefixes(index, path, vhost_file)
+                for path in _VHOST_ANY_PATH.findall(body):
+                    self._index_path_prefixes(index, path, vhost_file)
+        except OSError as e:
+            print(f"[vhost] Failed to index {vhost_dir}: {e}")
+        return index
+
+    @staticmethod
+    def _index_path_prefixes(index, path, vhost_file):
+        """
+        Maps a path and every ancestor prefix of it to a vhost file.
 
-            self.send_to_n8n(error_trace)
+        A docroot often sits one level below the project directory
+        (DocumentRoot /var/www/html/site9/public), while errors reference
+        files across the whole project (/var/www/html/site9/artisan.php).
+        Indexing the prefixes keeps those matching, as the old grep
+        substring search did; the lookup walks deepest-first, so the most
+        specific entry still wins.
+
+        Args:
+            index (dict): Index being built, mutated in place.
+            path (str): Absolute path mentioned by the vhost file.
+            vhost_file (str): The vhost file that mentions it.
+        """
+        path = path.rstrip('/')
+        while path not in ('', '/'):
+            index.setdefault(path, vhost_file)
+            path = os.path.dirname(path)
 
     def find_vhost_for_path(self, file_path, vhost_dir='/etc/apache2/sites-enabled'):
         """
         Finds the matching Apache vhost config for a given file path.
 
+        Resolves against a preloaded in-memory index of DocumentRoot /
+        <Directory> paths, rebuilt whenever any vhost file changes.
+
         Args:
             file_path (str): The full file path of the error file.
             vhost_dir (str): Apache vhost directory to search.
@@ -180,27 +760,30 @@ class LogWatcher:
         Returns:
             str | None: Path to matching vhost file, or None if not found.
         """
+        dir_signature = self._vhost_dir_signature(vhost_dir)
+        if self._vhost_index is None or dir_signature != self._vhost_index_mtime:
+            persisted = self._db_get(f"vhost_index:{vhost_dir}", dir_signature)
+            if persisted:
+                self._vhost_index = persisted[0]
+            else:
+                self._vhost_index = self._build_vhost_index(vhost_dir)
+                self._db_put(f"vhost_index:{vhost_dir}", dir_signature, self._vhost_index)
+            self._vhost_index_mtime = dir_signature
+            self.vhost_cache = {}
+
         if file_path in self.vhost_cache:
             return self.vhost_cache[file_path]
 
-        search_path = os.path.dirname(file_path)
         found_vhost = None
-
-        while True:
-            cmd = f"grep -l '{search_path}' {vhost_dir}/* || true"
-            result = subprocess.getoutput(cmd).strip()
-            if result:
-                found_vhost = result
+        for search_path in _ancestor_dirs(file_path):
+            if search_path in self._vhost_index:
+                found_vhost = self._vhost_index[search_path]
                 break
-            parent_path = os.path.dirname(search_path)
-            if parent_path == search_path or parent_path == '/':
-                break
-            search_path = parent_path
 
         self.vhost_cache[file_path] = found_vhost
         return found_vhost
 
-    def get_project_info(self, error_line):
+    async def get_project_info(self, error_line):
         """
         Extracts file, line number, vhost, git blame, and repo info for a PHP error.
 
@@ -208,11 +791,14 @@ class LogWatcher:
             error_line (str): Line or trace containing file path and line number.
 
         Returns:
-            dict: Structured metadata dictionary
+            dict: Structured metadata dictionary. 'blame' covers the header
+            line; 'frames' lists each stack frame with its own blame (served
+            from the cache the batched prewarm populated).
         """
+        frames = self._frame_blames(error_line)
 
         # Extract file path and line number, handling eval() and standard cases
-        match = re.search(r'in ([^\s]+?)(?:\((\d+)\) : eval\(\)\'d code)? on line (\d+)', error_line)
+        match = _IN_ON_LINE.search(error_line)
         if not match:
             return {
                 "file": None,
@@ -220,7 +806,8 @@ class LogWatcher:
                 "vhost": None,
                 "git_remote": None,
                 "stack_trace": "Stack trace:" in error_line,
-                "blame": None
+                "blame": None,
+                "frames": frames
             }
 
         file_path, eval_line, line_number = match.groups()
@@ -230,34 +817,63 @@ class LogWatcher:
 
         vhost = self.find_vhost_for_path(file_path) if file_path != 'eval()' else None
 
-        if dir_path and dir_path in self.git_root_cache:
-            repo_root = self.git_root_cache[dir_path]
-        else:
-            try:
-                repo_root = subprocess.check_output(
-                    ["git", "rev-parse", "--show-toplevel"],
+        # Cache keys carry the mtime of the file that would change the answer,
+        # so entries self-invalidate on commit/checkout/config edits. Those
+        # files live under the repo root's .git, not next to the erroring
+        # file, so resolve the governing .git via the ancestor chain first.
+        git_dir = self._git_dir_for(file_path) if dir_path else None
+        head_mtime = self._mtime_ns(os.path.join(git_dir, 'HEAD')) if git_dir else 0
+        config_mtime = self._mtime_ns(os.path.join(git_dir, 'config')) if git_dir else 0
+        root_key = (dir_path, head_mtime) if dir_path else None
+        remote_key = (dir_path, config_mtime) if dir_path else None
+
+        # On a memory miss, try the persistent layer before forking git.
+        if dir_path and root_key not in self.git_root_cache:
+            persisted = self._db_get(f"root:{dir_path}", root_key[1])
+            if persisted:
+                self.git_root_cache[root_key] = persisted[0]
+        if dir_path and remote_key not in self.git_remote_cache:
+            persisted = self._db_get(f"remote:{dir_path}", remote_key[1])
+            if persisted:
+                self.git_remote_cache[remote_key] = persisted[0]
+
+        repo_root = self.git_root_cache.get(root_key) if dir_path else None
+        git_remote = self.git_remote_cache.get(remote_key) if dir_path else 'unknown'
+
+        # Launch rev-parse and config lookups concurrently on cache miss;
+        # they are independent, so per-error latency is max() not sum().
+        if dir_path and (root_key not in self.git_root_cache or remote_key not in self.git_remote_cache):
+            rev_parse_proc, remote_proc = await asyncio.gather(
+                asyncio.create_subprocess_exec(
+                    "git", "rev-parse", "--show-toplevel",
                     cwd=dir_path,
-                    text=True
-                ).strip() if dir_path else None
-            except subprocess.CalledProcessError:
-                repo_root = None
-            if dir_path:
-                self.git_root_cache[dir_path] = repo_root
-
-        if dir_path and dir_path in self.git_remote_cache:
-            git_remote = self.git_remote_cache[dir_path]
-        else:
-            git_remote = subprocess.getoutput(
-                f"cd '{dir_path}' && git config --get remote.origin.url || echo 'unknown'"
-            ).strip() if dir_path else 'unknown'
-            if dir_path:
-                self.git_remote_cache[dir_path] = git_remote
-
-        blame_key = f"{file_path}:{line_number}" if file_path != 'eval()' else None
-
-        blame = self.get_git_blame(file_path, line_number, repo_root) if blame_key else None
-        if blame_key:
-            self.git_blame_cache[blame_key] = blame
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    close_fds=False
+                ),
+                asyncio.create_subprocess_exec(
+                    "git", "config", "--get", "remote.origin.url",
+                    cwd=dir_path,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    close_fds=False
+                )
+            )
+            (root_out, _), (remote_out, _) = await asyncio.gather(
+                rev_parse_proc.communicate(),
+                remote_proc.communicate()
+            )
+            repo_root = root_out.decode().strip() if rev_parse_proc.returncode == 0 else None
+            git_remote = remote_out.decode().strip() if remote_proc.returncode == 0 else ''
+            git_remote = git_remote or 'unknown'
+            self.git_root_cache[root_key] = repo_root
+            self.git_remote_cache[remote_key] = git_remote
+            self._db_put(f"root:{dir_path}", root_key[1], repo_root)
+            self._db_put(f"remote:{dir_path}", remote_key[1], git_remote)
+
+        # get_git_blame checks and populates git_blame_cache itself, keyed by
+        # (file, line, file mtime); only a true file change triggers a re-blame.
+        blame = await self.get_git_blame(file_path, line_number, repo_root) if file_path != 'eval()' else None
 
         return {
             "file": file_path,
@@ -265,10 +881,108 @@ class LogWatcher:
             "vhost": vhost.strip() if vhost else None,
             "git_remote": git_remote,
             "stack_trace": "Stack trace:" in error_line,
-            "blame": blame
+            "blame": blame,
+            "frames": frames
         }
 
-    def get_git_blame(self, file_path, line_number, repo_path=None):
+    def _frame_blames(self, error_trace):
+        """
+        Collects per-frame blame info for every stack frame in a trace.
+
+        Cache-only: the batched prewarm has already blamed these lines, so
+        this never spawns a subprocess — frames whose blame is not cached
+        (e.g. uncommitted lines) report None.
+
+        Args:
+            error_trace (str): Full (possibly multi-line) error trace.
+
+        Returns:
+            list: One {'file', 'line', 'blame'} dict per stack frame, in order.
+        """
+        frames = []
+        for frame_file, frame_line in _STACK_FRAME.findall(error_trace):
+            frame_line = int(frame_line)
+            frame_key = (frame_file, frame_line, self._mtime_ns(frame_file))
+            frames.append({
+                "file": frame_file,
+                "line": frame_line,
+                "blame": self.git_blame_cache[frame_key] if frame_key in self.git_blame_cache else None
+            })
+        return frames
+
+    async def _prewarm_blame_cache(self, error_trace):
+        """
+        Batch-blames every (file, line) referenced in a multi-line trace.
+
+        A PHP fatal usually carries a stack trace of frames from the same
+        repo; blaming them one at a time pays git's startup cost per frame.
+        This groups lines per file and runs a single `git blame --porcelain`
+        with multiple -L ranges per file, populating git_blame_cache in one
+        subprocess instead of one per frame.
+
+        Args:
+            error_trace (str): Full (possibly multi-line) error trace.
+        """
+        lines_by_file = {}
+        for file_path, _eval_line, line_number in _IN_ON_LINE.findall(error_trace):
+            if file_path == 'eval()' or not os.path.isabs(file_path):
+                continue
+            lines_by_file.setdefault(file_path, set()).add(int(line_number))
+        for file_path, line_number in _STACK_FRAME.findall(error_trace):
+            lines_by_file.setdefault(file_path, set()).add(int(line_number))
+
+        for file_path, line_numbers in lines_by_file.items():
+            mtime = self._mtime_ns(file_path)
+            missing = sorted(
+                n for n in line_numbers
+                if (file_path, n, mtime) not in self.git_blame_cache
+            )
+            if not missing:
+                continue
+
+            args = ["git", "blame", "--porcelain"]
+            for n in missing:
+                args += ["-L", f"{n},{n}"]
+            args.append(os.path.basename(file_path))
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                cwd=os.path.dirname(file_path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                close_fds=False
+            )
+            blame_bytes, _ = await proc.communicate()
+            if proc.returncode != 0:
+                continue
+
+            blames = await self._parse_offloaded(_parse_porcelain, blame_bytes)
+            for line_number, blame in blames.items():
+                # Uncommitted lines are left uncached so get_git_blame can
+                # still attach the diff summary for them.
+                if line_number in line_numbers and not blame["is_local_changes"]:
+                    self.git_blame_cache[(file_path, line_number, mtime)] = blame
+
+    async def _parse_offloaded(self, parser, data, *args):
+        """
+        Runs a pure parse function inline, or in the process pool when large.
+
+        Small outputs are cheaper to parse on the loop than to pickle across
+        a process boundary; big blame/diff streams would otherwise starve the
+        tailer, so they go to a pool worker.
+
+        Args:
+            parser (callable): Module-level parse function (picklable).
+            data (bytes): Raw subprocess output to parse.
+            *args: Extra positional arguments for the parser.
+
+        Returns:
+            The parser's result.
+        """
+        if len(data) <= self.PARSE_OFFLOAD_BYTES:
+            return parser(data, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, parser, data, *args)
+
+    async def get_git_blame(self, file_path, line_number, repo_path=None):
         """
         Runs `git blame` on a specific line to get commit and author info.
 
@@ -283,15 +997,25 @@ class LogWatcher:
         if not repo_path or file_path == 'eval()':
             return None
 
+        blame_key = (file_path, line_number, self._mtime_ns(file_path))
+        if blame_key in self.git_blame_cache:
+            return self.git_blame_cache[blame_key]
+
         try:
             rel_path = os.path.relpath(file_path, repo_path)
-            blame_output = subprocess.check_output(
-                ["git", "blame", "-L", f"{line_number},{line_number}", "--porcelain", rel_path],
+            blame_proc = await asyncio.create_subprocess_exec(
+                "git", "blame", "-L", f"{line_number},{line_number}", "--porcelain", rel_path,
                 cwd=repo_path,
-                text=True
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                close_fds=False
             )
+            blame_output, _ = await blame_proc.communicate()
+            if blame_proc.returncode != 0:
+                raise subprocess.CalledProcessError(blame_proc.returncode, "git blame")
 
-            blame = {
+            blames = await self._parse_offloaded(_parse_porcelain, blame_output)
+            blame = blames.get(line_number) or {
                 "author": None,
                 "email": None,
                 "commit": None,
@@ -299,50 +1023,32 @@ class LogWatcher:
                 "is_local_changes": False
             }
 
-            for line in blame_output.splitlines():
-                if re.match(r"^0{8,40}", line):  # Uncommitted line marked by all-zero commit
-                    blame["is_local_changes"] = True
-                if line.startswith("author "):
-                    blame["author"] = line[7:]
-                elif line.startswith("author-mail "):
-                    blame["email"] = line[12:].strip("<>")
-                elif line.startswith("summary "):
-                    blame["summary"] = line[8:]
-                elif re.match(r"^[a-f0-9]{40}", line):
-                    blame["commit"] = line.split()[0][:8]
-
             if blame["is_local_changes"]:
-                # Read git diff only for that file
-                diff_output = subprocess.check_output(
-                    ["git", "diff", rel_path],
+                # Zero-context diff for just this file: output shrinks to the
+                # changed lines themselves, so there is far less to parse.
+                # The working-tree mtime is fetched in parallel since neither
+                # depends on the other.
+                diff_proc = await asyncio.create_subprocess_exec(
+                    "git", "diff", "-U0", "--no-color", rel_path,
                     cwd=repo_path,
-                    text=True
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    close_fds=False
                 )
-                # Find diff line related to the requested line number
-                line_diff = None
-                hunk_header_pattern = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
-                current_line = 0
-
-                for diff_line in diff_output.splitlines():
-                    match = hunk_header_pattern.match(diff_line)
-                    in_hunk = True
-                    if match:
-                        start_line = int(match.group(1))
-                        line_count = int(match.group(2)) if match.group(2) else 1
-                        current_line = start_line
-                        in_hunk = (start_line <= line_number < start_line + line_count)
-                    elif in_hunk and (diff_line.startswith('+') or diff_line.startswith('-') or diff_line.startswith(' ')):
-                        if current_line == line_number:
-                            line_diff = diff_line
-                            break
-                        if not diff_line.startswith('-'):
-                            current_line += 1
-
-                last_modified = datetime.datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+                (diff_output, _), mtime = await asyncio.gather(
+                    diff_proc.communicate(),
+                    asyncio.to_thread(os.path.getmtime, file_path)
+                )
+                # With -U0 every hunk is only '-'/'+' lines; jump straight to
+                # the hunk covering the target line instead of scanning all.
+                line_diff = await self._parse_offloaded(_find_diff_line, diff_output, line_number)
+
+                last_modified = datetime.datetime.fromtimestamp(mtime).isoformat()
                 blame["summary"] = f"[Uncommitted changes] Last modified: {last_modified}"
                 if line_diff:
-                    blame["summary"] += f" | Diff line: {line_diff.strip()}"
+                    blame["summary"] += f" | Diff line: {line_diff.decode('utf-8', 'replace').strip()}"
 
+            self.git_blame_cache[blame_key] = blame
             return blame
 
         except subprocess.CalledProcessError as e:
@@ -350,5 +1056,10 @@ class LogWatcher:
             return None
 
 if __name__ == '__main__':
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass  # stock asyncio loop works too, just with more per-await overhead
     watcher = LogWatcher(config_path='config.json', reload_interval=10)
-    watcher.run()
+    asyncio.run(watcher.run())